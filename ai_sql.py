@@ -2,49 +2,147 @@ import sqlite3
 import pandas as pd
 import logging
 import os
+import re
+import sys
+from itertools import chain
 
 # Setup logging to capture errors in error_log.txt
 logging.basicConfig(filename='error_log.txt',
                     level=logging.ERROR,
                     format='%(asctime)s %(levelname)s: %(message)s')
 
-def infer_sqlite_type(series):
+# Number of CSV rows read and inserted at a time
+CSV_CHUNK_SIZE = 100_000
+
+# PRAGMAs applied once at connect time: WAL journaling (fsync only at checkpoints
+# with synchronous=NORMAL), in-memory temp tables, a 128 MiB page cache and 256 MiB mmap
+CONNECTION_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-131072",
+    "mmap_size=268435456",
+)
+
+# Table names must be plain identifiers so they can be safely quoted into SQL
+IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# One reusable cursor per connection, shared by the helpers below
+_cursors = {}
+
+def get_cursor(conn):
     """
-    Infer the SQLite data type for a pandas Series.
+    Return the shared cursor for a connection, creating it on first use.
     """
-    if pd.api.types.is_integer_dtype(series):
-        return "INTEGER"
-    elif pd.api.types.is_float_dtype(series):
-        return "REAL"
-    else:
-        return "TEXT"
+    cur = _cursors.get(conn)
+    if cur is None:
+        cur = _cursors[conn] = conn.cursor()
+    return cur
+
+def close_connection(conn):
+    """
+    Close a connection and drop its shared cursor. The cursor refers back to
+    the connection, so the entry must be removed explicitly to free both.
+    """
+    cur = _cursors.pop(conn, None)
+    if cur is not None:
+        cur.close()
+    conn.close()
+
+# Remaining stdin lines when input is piped rather than typed (None when interactive)
+_piped_lines = None
+
+def buffer_piped_input():
+    """
+    If stdin is not a terminal (e.g. a script of commands is piped in), read it
+    all up front so each command is served from memory without prompting.
+    """
+    global _piped_lines
+    if not sys.stdin.isatty():
+        _piped_lines = iter(sys.stdin.read().splitlines())
+
+def read_input(prompt):
+    """
+    Read one line of user input, prompting only when running interactively.
+    Raises EOFError when piped input is exhausted, like input().
+    """
+    if _piped_lines is None:
+        return input(prompt)
+    line = next(_piped_lines, None)
+    if line is None:
+        raise EOFError
+    return line
+
+def safe_ident(name):
+    """
+    Validate that name is a plain SQL identifier, raising ValueError otherwise.
+    """
+    if not IDENTIFIER_RE.match(name):
+        raise ValueError(f"Invalid table name: {name!r}")
+    return name
+
+# SQLite column type for each numpy dtype kind; anything else is stored as TEXT
+SQLITE_TYPE_BY_KIND = {'i': "INTEGER", 'u': "INTEGER", 'b': "INTEGER", 'f': "REAL"}
+
+def infer_sqlite_type(dtype):
+    """
+    Infer the SQLite data type for a pandas/numpy dtype.
+    """
+    return SQLITE_TYPE_BY_KIND.get(dtype.kind, "TEXT")
 
 def create_table_from_dataframe(conn, df, table_name):
     """
     Create a SQLite table with a schema inferred from the dataframe.
+    Returns True if the table was created, False otherwise.
     """
-    columns = df.columns
-    schema_parts = []
-    for col in columns:
-        dtype = infer_sqlite_type(df[col])
-        schema_parts.append(f'"{col}" {dtype}')
-    schema_str = ", ".join(schema_parts)
-    create_table_sql = f'CREATE TABLE "{table_name}" ({schema_str});'
+    schema_str = ", ".join(f'"{col}" {infer_sqlite_type(dtype)}'
+                           for col, dtype in df.dtypes.items())
     
     try:
-        cur = conn.cursor()
-        cur.execute(create_table_sql)
-        conn.commit()
+        create_table_sql = f'CREATE TABLE "{safe_ident(table_name)}" ({schema_str});'
+        get_cursor(conn).execute(create_table_sql)
         print(f"Table '{table_name}' created successfully.")
+        return True
     except Exception as e:
         logging.error(f"Error creating table {table_name}: {str(e)}")
         print(f"Error creating table '{table_name}'. Check error_log.txt for details.")
+        return False
+
+def insert_dataframes(conn, frames, table_name):
+    """
+    Bulk insert the rows of one or more dataframes into an existing table.
+    Each frame goes through a single executemany, and all of them share one
+    explicit transaction instead of the per-row overhead of DataFrame.to_sql.
+    Rows are built by zipping per-column ndarray.tolist() results, which box
+    each column into Python values in one C-level pass.
+    fsync is disabled for the duration of the load and restored afterwards.
+    """
+    insert_sql = None
+    cur = get_cursor(conn)
+    # A transaction opened by a user query (e.g. BEGIN) must be closed first:
+    # neither the synchronous level nor BEGIN IMMEDIATE can be set inside one.
+    if conn.in_transaction:
+        conn.commit()
+    try:
+        cur.execute("PRAGMA synchronous=OFF;")
+        with conn:
+            cur.execute("BEGIN IMMEDIATE;")
+            for df in frames:
+                if insert_sql is None:
+                    # Name the columns so values match by header, not by position
+                    names = ", ".join(f'"{col}"' for col in df.columns)
+                    placeholders = ", ".join("?" * len(df.columns))
+                    insert_sql = f'INSERT INTO "{table_name}" ({names}) VALUES ({placeholders});'
+                columns = [series.to_numpy().tolist() for _, series in df.items()]
+                cur.executemany(insert_sql, zip(*columns))
+    finally:
+        cur.execute("PRAGMA synchronous=NORMAL;")
 
 def table_exists(conn, table_name):
     """
     Check if a table exists in the SQLite database.
     """
-    cur = conn.cursor()
+    cur = get_cursor(conn)
     cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?;", (table_name,))
     return cur.fetchone() is not None
 
@@ -53,9 +151,7 @@ def drop_table(conn, table_name):
     Drop an existing table from the SQLite database.
     """
     try:
-        cur = conn.cursor()
-        cur.execute(f'DROP TABLE IF EXISTS "{table_name}";')
-        conn.commit()
+        get_cursor(conn).execute('DROP TABLE IF EXISTS "' + safe_ident(table_name) + '";')
         print(f"Table '{table_name}' dropped.")
     except Exception as e:
         logging.error(f"Error dropping table {table_name}: {str(e)}")
@@ -64,51 +160,64 @@ def drop_table(conn, table_name):
 def load_csv_to_db(conn):
     """
     Load a CSV file into the SQLite database by:
-      - Reading the CSV with pandas.
-      - Inferring the schema and creating the table dynamically.
-      - Inserting the CSV data into the created table.
+      - Streaming the CSV with pandas in chunks of CSV_CHUNK_SIZE rows.
+      - Inferring the schema from the first chunk and creating the table dynamically.
+      - Inserting every chunk into the created table.
     """
-    csv_path = input("Enter CSV file path: ").strip()
+    csv_path = read_input("Enter CSV file path: ").strip()
     if not os.path.isfile(csv_path):
         print("CSV file not found.")
         return
-    table_name = input("Enter desired table name: ").strip()
+    table_name = read_input("Enter desired table name: ").strip()
+    if not IDENTIFIER_RE.match(table_name):
+        print("Invalid table name. Use letters, digits and underscores only.")
+        return
     try:
-        df = pd.read_csv(csv_path)
+        reader = pd.read_csv(csv_path, chunksize=CSV_CHUNK_SIZE)
+        first_chunk = next(reader, None)
     except Exception as e:
         logging.error(f"Error reading CSV file {csv_path}: {str(e)}")
         print("Error reading CSV file. Check error_log.txt for details.")
         return
+    if first_chunk is None:
+        reader.close()
+        print("CSV file has no rows. Skipping CSV load.")
+        return
 
-    if table_exists(conn, table_name):
-        print(f"Table '{table_name}' already exists.")
-        choice = input("Do you want to Overwrite (O), Rename (R), or Skip (S) this table? ").strip().upper()
-        if choice == 'O':
-            drop_table(conn, table_name)
-        elif choice == 'R':
-            new_table_name = input("Enter new table name: ").strip()
-            table_name = new_table_name
-        elif choice == 'S':
+    with reader:
+        if table_exists(conn, table_name):
+            print(f"Table '{table_name}' already exists.")
+            choice = read_input("Do you want to Overwrite (O), Rename (R), or Skip (S) this table? ").strip().upper()
+            if choice == 'O':
+                drop_table(conn, table_name)
+            elif choice == 'R':
+                new_table_name = read_input("Enter new table name: ").strip()
+                if not IDENTIFIER_RE.match(new_table_name):
+                    print("Invalid table name. Skipping CSV load.")
+                    return
+                table_name = new_table_name
+            elif choice == 'S':
+                print("Skipping CSV load.")
+                return
+            else:
+                print("Invalid choice. Skipping CSV load.")
+                return
+
+        if not create_table_from_dataframe(conn, first_chunk, table_name):
             print("Skipping CSV load.")
             return
-        else:
-            print("Invalid choice. Skipping CSV load.")
-            return
-
-    create_table_from_dataframe(conn, df, table_name)
-    try:
-        # Use if_exists='append' to insert data after table creation
-        df.to_sql(table_name, conn, if_exists='append', index=False)
-        print(f"Data inserted into table '{table_name}' successfully.")
-    except Exception as e:
-        logging.error(f"Error inserting data into table {table_name}: {str(e)}")
-        print("Error inserting data into table. Check error_log.txt for details.")
+        try:
+            insert_dataframes(conn, chain([first_chunk], reader), table_name)
+            print(f"Data inserted into table '{table_name}' successfully.")
+        except Exception as e:
+            logging.error(f"Error inserting data into table {table_name}: {str(e)}")
+            print("Error inserting data into table. Check error_log.txt for details.")
 
 def list_tables(conn):
     """
     List all tables in the SQLite database.
     """
-    cur = conn.cursor()
+    cur = get_cursor(conn)
     cur.execute("SELECT name FROM sqlite_master WHERE type='table';")
     tables = cur.fetchall()
     if tables:
@@ -122,9 +231,9 @@ def run_sql_query(conn):
     """
     Execute a SQL query entered by the user and print the results.
     """
-    query = input("Enter your SQL query: ").strip()
+    query = read_input("Enter your SQL query: ").strip()
     try:
-        cur = conn.cursor()
+        cur = get_cursor(conn)
         cur.execute(query)
         rows = cur.fetchall()
         if rows:
@@ -136,15 +245,7 @@ def run_sql_query(conn):
         logging.error(f"Error executing query '{query}': {str(e)}")
         print("Error executing query. Check error_log.txt for details.")
 
-def convert_natural_language_to_sql():
-    """
-    Simulate converting a natural language query into a SQL statement.
-    In a real implementation, this function might call an LLM API.
-    """
-    nl_query = input("Enter your natural language query: ").strip()
-    # For demonstration, a simple hard-coded example mapping is provided.
-    if "top 5 products by total revenue this month" in nl_query.lower():
-        sql_query = """
+TOP5_PRODUCTS_SQL = """
         SELECT p.product_name, SUM(s.revenue) AS total_revenue
         FROM sales s
         JOIN products p ON s.product_id = p.product_id
@@ -153,12 +254,27 @@ def convert_natural_language_to_sql():
         ORDER BY total_revenue DESC
         LIMIT 5;
         """
-        print("Generated SQL query:")
-        print(sql_query)
-        return sql_query
-    else:
-        print("No mapping found for the provided natural language query.")
-        return None
+
+# Precompiled natural language patterns and the SQL each one maps to, checked in order
+NL_PATTERNS = [
+    (re.compile(r"top\s+5\s+products\s+by\s+total\s+revenue\s+this\s+month", re.IGNORECASE),
+     TOP5_PRODUCTS_SQL),
+]
+
+def convert_natural_language_to_sql():
+    """
+    Simulate converting a natural language query into a SQL statement.
+    In a real implementation, this function might call an LLM API.
+    """
+    nl_query = read_input("Enter your natural language query: ").strip()
+    # For demonstration, hard-coded example mappings are provided in NL_PATTERNS.
+    for pattern, sql_query in NL_PATTERNS:
+        if pattern.search(nl_query):
+            print("Generated SQL query:")
+            print(sql_query)
+            return sql_query
+    print("No mapping found for the provided natural language query.")
+    return None
 
 def main():
     """
@@ -171,48 +287,59 @@ def main():
       5. Exiting the application.
     """
     db_path = "example.db"
-    conn = sqlite3.connect(db_path)
+    # Autocommit mode (bulk inserts open their own transaction) with a larger
+    # prepared-statement cache for the repeated helper queries.
+    conn = sqlite3.connect(db_path, cached_statements=256, isolation_level=None)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(f"PRAGMA {pragma};")
     print("Connected to SQLite database.")
+    buffer_piped_input()
 
-    while True:
-        print("\nOptions:")
-        print("1. Load CSV into database")
-        print("2. List tables")
-        print("3. Run a SQL query")
-        print("4. Convert natural language query to SQL")
-        print("5. Exit")
-        choice = input("Enter your choice (1-5): ").strip()
-
-        if choice == "1":
-            load_csv_to_db(conn)
-        elif choice == "2":
-            list_tables(conn)
-        elif choice == "3":
-            run_sql_query(conn)
-        elif choice == "4":
-            sql_query = convert_natural_language_to_sql()
-            if sql_query:
-                run_now = input("Do you want to execute the generated SQL query? (Y/N): ").strip().upper()
-                if run_now == "Y":
-                    try:
-                        cur = conn.cursor()
-                        cur.execute(sql_query)
-                        rows = cur.fetchall()
-                        if rows:
-                            for row in rows:
-                                print(row)
-                        else:
-                            print("Query executed successfully. No rows returned.")
-                    except Exception as e:
-                        logging.error(f"Error executing generated query: {str(e)}")
-                        print("Error executing generated query. Check error_log.txt for details.")
-        elif choice == "5":
-            print("Exiting the assistant.")
-            break
-        else:
-            print("Invalid option. Please try again.")
+    # Running out of input (e.g. the end of a piped script), even in the middle
+    # of a command, ends the session like choosing Exit.
+    try:
+        while True:
+            if _piped_lines is None:
+                print("\nOptions:")
+                print("1. Load CSV into database")
+                print("2. List tables")
+                print("3. Run a SQL query")
+                print("4. Convert natural language query to SQL")
+                print("5. Exit")
+            choice = read_input("Enter your choice (1-5): ").strip()
 
-    conn.close()
+            if choice == "1":
+                load_csv_to_db(conn)
+            elif choice == "2":
+                list_tables(conn)
+            elif choice == "3":
+                run_sql_query(conn)
+            elif choice == "4":
+                sql_query = convert_natural_language_to_sql()
+                if sql_query:
+                    run_now = read_input("Do you want to execute the generated SQL query? (Y/N): ").strip().upper()
+                    if run_now == "Y":
+                        try:
+                            cur = get_cursor(conn)
+                            cur.execute(sql_query)
+                            rows = cur.fetchall()
+                            if rows:
+                                for row in rows:
+                                    print(row)
+                            else:
+                                print("Query executed successfully. No rows returned.")
+                        except Exception as e:
+                            logging.error(f"Error executing generated query: {str(e)}")
+                            print("Error executing generated query. Check error_log.txt for details.")
+            elif choice == "5":
+                print("Exiting the assistant.")
+                break
+            else:
+                print("Invalid option. Please try again.")
+    except EOFError:
+        print("Exiting the assistant.")
+
+    close_connection(conn)
 
 if __name__ == "__main__":
     main()
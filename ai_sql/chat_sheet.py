@@ -12,15 +12,43 @@ Features:
 """
 
 import argparse
+import hashlib
 import logging
 import os
 import re
 import sqlite3
+from itertools import chain
 from pathlib import Path
+from typing import Iterable
 
 import pandas as pd
 from openai import OpenAI, OpenAIError
 
+# Number of CSV rows read and inserted at a time
+CSV_CHUNK_SIZE = 100_000
+
+# PRAGMAs applied once at connect time: WAL journaling (fsync only at checkpoints
+# with synchronous=NORMAL), in-memory temp tables, a 128 MiB page cache and 256 MiB mmap
+CONNECTION_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-131072",
+    "mmap_size=268435456",
+)
+
+# SQLite column type for each numpy dtype kind; anything else is stored as TEXT
+SQLITE_TYPE_BY_KIND = {"i": "INTEGER", "u": "INTEGER", "b": "INTEGER", "f": "REAL"}
+
+# Last schema description built by get_schema, keyed by connection + schema_version
+_schema_cache = {"conn": None, "version": None, "text": None}
+
+# Markdown code fence (optionally tagged sql) around the SQL in AI replies
+SQL_FENCE_RE = re.compile(r"```(?:sql)?\s*([\s\S]*?)\s*```", re.IGNORECASE)
+
+# Table persisting AI-generated SQL across runs (hidden from list/schema)
+LLM_CACHE_TABLE = "llm_cache"
+
 
 def setup_logging(level: str) -> None:
     """Configure root logger with timestamped, leveled output."""
@@ -57,32 +85,122 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def connect(db_path: Path) -> sqlite3.Connection:
+    """
+    Open the database and apply CONNECTION_PRAGMAS.
+    With debug logging enabled, every statement is traced to the log.
+    """
+    conn = sqlite3.connect(str(db_path))
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(f"PRAGMA {pragma}")
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        conn.set_trace_callback(lambda sql: logging.debug("SQL: %s", sql))
+    return conn
+
+
+def quote_ident(name: str) -> str:
+    """Quote an identifier for SQLite, escaping embedded double quotes."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def infer_sqlite_type(dtype) -> str:
+    """Map a pandas/numpy dtype to a SQLite column type."""
+    return SQLITE_TYPE_BY_KIND.get(dtype.kind, "TEXT")
+
+
+def create_table_sql(table: str, df: pd.DataFrame) -> str:
+    """Build a CREATE TABLE IF NOT EXISTS statement matching df's columns."""
+    columns = ", ".join(
+        f"{quote_ident(str(col))} {infer_sqlite_type(dtype)}"
+        for col, dtype in df.dtypes.items()
+    )
+    return f"CREATE TABLE IF NOT EXISTS {quote_ident(table)} ({columns})"
+
+
+def insert_dataframes(
+    conn: sqlite3.Connection, table: str, frames: Iterable[pd.DataFrame]
+) -> None:
+    """
+    Bulk insert all frames into table, one executemany each.
+    Each column is boxed into Python values with a single ndarray.tolist()
+    call rather than per cell. Missing values (NaN) are stored by SQLite as
+    NULL. The caller owns the transaction.
+    """
+    insert_sql = None
+    for df in frames:
+        if insert_sql is None:
+            # Name the columns so appends match by header, not by position
+            names = ", ".join(quote_ident(str(col)) for col in df.columns)
+            placeholders = ", ".join("?" * len(df.columns))
+            insert_sql = (
+                f"INSERT INTO {quote_ident(table)} ({names}) VALUES ({placeholders})"
+            )
+        columns = [series.to_numpy().tolist() for _, series in df.items()]
+        conn.executemany(insert_sql, zip(*columns))
+
+
 def load_csv_to_sqlite(
     conn: sqlite3.Connection, csv_path: Path, if_exists: str = "fail"
 ) -> None:
     """
     Load a CSV file into SQLite.
     - Infers table name from filename (stem of csv_path)
-    - Uses pandas.to_sql with the given if_exists behavior
+    - Streams the CSV in chunks of CSV_CHUNK_SIZE rows
+    - Handles an existing table according to if_exists (fail, replace or
+      append), creates the table from the first chunk's dtypes and bulk
+      inserts every chunk with executemany, all in a single transaction
+      with fsync disabled until it commits
     """
+    if if_exists not in ("fail", "replace", "append"):
+        logging.error("Invalid load mode '%s' (use append, replace or fail).", if_exists)
+        return
+
     table = csv_path.stem
     try:
-        df = pd.read_csv(csv_path)
+        reader = pd.read_csv(csv_path, chunksize=CSV_CHUNK_SIZE)
     except FileNotFoundError:
         logging.error("CSV file not found: %s", csv_path)
         return
 
-    try:
-        df.to_sql(table, conn, if_exists=if_exists, index=False)
-        logging.info("Loaded '%s' into table '%s'.", csv_path, table)
-    except ValueError as ve:
-        logging.error("Failed to load CSV: %s", ve)
+    with reader:
+        try:
+            first_chunk = next(reader, None)
+            if first_chunk is None:
+                logging.error("CSV file has no rows: %s", csv_path)
+                return
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                (table,),
+            ).fetchone()
+            if exists and if_exists == "fail":
+                logging.error("Table '%s' already exists.", table)
+                return
+
+            # Earlier `sql` commands may have left an implicit transaction
+            # open; commit it so the load can start its own.
+            if conn.in_transaction:
+                conn.commit()
+            try:
+                conn.execute("PRAGMA synchronous=OFF")
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    if if_exists == "replace":
+                        conn.execute(f"DROP TABLE IF EXISTS {quote_ident(table)}")
+                    conn.execute(create_table_sql(table, first_chunk))
+                    insert_dataframes(conn, table, chain([first_chunk], reader))
+            finally:
+                conn.execute("PRAGMA synchronous=NORMAL")
+            logging.info("Loaded '%s' into table '%s'.", csv_path, table)
+        except (ValueError, sqlite3.Error) as e:
+            logging.error("Failed to load CSV: %s", e)
 
 
 def list_tables(conn: sqlite3.Connection) -> None:
     """List all tables in the SQLite database."""
     cur = conn.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
+        "SELECT name FROM sqlite_master WHERE type='table' AND name != ? "
+        "ORDER BY name",
+        (LLM_CACHE_TABLE,),
     )
     tables = [row[0] for row in cur]
     if tables:
@@ -91,14 +209,68 @@ def list_tables(conn: sqlite3.Connection) -> None:
         logging.info("No tables found.")
 
 
-def execute_sql(conn: sqlite3.Connection, sql: str) -> None:
-    """Execute raw SQL and print results."""
+def execute_sql(conn: sqlite3.Connection, sql: str) -> bool:
+    """Execute raw SQL and print results. Returns False on SQL errors."""
     try:
         rows = conn.execute(sql).fetchall()
         for row in rows:
             print(row)
     except sqlite3.Error as e:
         logging.error("SQL error: %s", e)
+        return False
+    return True
+
+
+def is_valid_sql(conn: sqlite3.Connection, sql: str) -> bool:
+    """Check that sql compiles against the current schema, without running it."""
+    try:
+        conn.execute(f"EXPLAIN {sql}")
+    except (sqlite3.Error, sqlite3.Warning):
+        return False
+    return True
+
+
+def get_schema(conn: sqlite3.Connection) -> str:
+    """
+    Describe all tables as "table(col1, col2); ...".
+    The text is cached and only rebuilt when SQLite's schema_version changes.
+    """
+    version = conn.execute(
+        "SELECT schema_version FROM pragma_schema_version"
+    ).fetchone()[0]
+    if _schema_cache["conn"] is conn and _schema_cache["version"] == version:
+        return _schema_cache["text"]
+
+    columns = {}
+    for table, col in conn.execute(
+        "SELECT m.name, p.name "
+        "FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p "
+        "WHERE m.type='table' AND m.name != ? ORDER BY m.name, p.cid",
+        (LLM_CACHE_TABLE,),
+    ):
+        columns.setdefault(table, []).append(col)
+    text = "; ".join(f"{t}({', '.join(cols)})" for t, cols in columns.items())
+
+    _schema_cache.update(conn=conn, version=version, text=text)
+    return text
+
+
+def init_llm_cache(conn: sqlite3.Connection) -> None:
+    """Create the table that memoizes AI-generated SQL, if missing."""
+    with conn:
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS "{LLM_CACHE_TABLE}" '
+            "(key TEXT PRIMARY KEY, sql TEXT, explanation TEXT)"
+        )
+
+
+def llm_cache_key(schema: str, user_query: str) -> str:
+    """
+    Hash the schema together with a normalized form of the request
+    (lowercased, whitespace collapsed, trailing punctuation dropped).
+    """
+    normalized = " ".join(user_query.lower().split()).rstrip("?.! ")
+    return hashlib.sha256(f"{schema}\0{normalized}".encode()).hexdigest()
 
 
 def generate_sql_via_ai(
@@ -106,48 +278,67 @@ def generate_sql_via_ai(
 ) -> None:
     """Use OpenAI to translate natural language into SQL and run it."""
     # 1) Build schema context
-    tables = conn.execute(
-        "SELECT name FROM sqlite_master WHERE type='table'"
-    ).fetchall()
-    schema_parts = []
-    for (t,) in tables:
-        cols = conn.execute(f"PRAGMA table_info({t})").fetchall()
-        col_names = [c[1] for c in cols]
-        schema_parts.append(f"{t}({', '.join(col_names)})")
-    schema = "; ".join(schema_parts)
-
-    # 2) Prepare system & user messages
+    schema = get_schema(conn)
+
+    # 2) Reuse SQL previously generated for the same request and schema
+    key = llm_cache_key(schema, user_query)
+    cached = conn.execute(
+        f'SELECT sql, explanation FROM "{LLM_CACHE_TABLE}" WHERE key = ?',
+        (key,),
+    ).fetchone()
+    if cached:
+        sql, explanation = cached
+        logging.debug("Using cached SQL for request: %s", user_query)
+        print("Executing SQL:\n", sql)
+        if explanation:
+            print("\n Explanation:\n", explanation)
+        execute_sql(conn, sql)
+        return
+
+    # 3) Prepare system & user messages. Everything but the user request
+    #    lives in the system message, so the prompt prefix stays
+    #    byte-identical across calls and can hit the provider's prompt cache.
     system_msg = (
         "You are an AI assistant that converts plain-English questions "
-        "into valid SQLite queries."
-    )
-    user_msg = (
+        "into valid SQLite queries.\n"
         f"Database schema: {schema}\n"
-        f"User request: {user_query}\n"
         "Respond with a single valid SQL query, then a one-sentence "
         "explanation on the next line."
     )
+    user_msg = f"User request: {user_query}"
 
-    # 3) Call the API
+    # 4) Stream the reply. Once a complete fenced SQL block has arrived and
+    #    passes an EXPLAIN check, stop reading instead of waiting for the
+    #    explanation tokens; if it fails, keep reading for the explanation.
+    raw = ""
+    m = None
     try:
-        resp = client.chat.completions.create(
+        stream = client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": system_msg},
                 {"role": "user", "content": user_msg},
             ],
             temperature=0,
+            stream=True,
         )
+        with stream:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                raw += chunk.choices[0].delta.content or ""
+                if m is None and raw.count("```") >= 2:
+                    m = SQL_FENCE_RE.search(raw)
+                    if m and is_valid_sql(conn, m.group(1).strip()):
+                        break
     except OpenAIError as e:
         logging.error("OpenAI API error: %s", e)
         return
 
-    # 4) Strip Markdown fences, extract SQL & explanation
-    raw = resp.choices[0].message.content or ""
-    m = re.search(r"```(?:sql)?\s*([\s\S]*?)\s*```", raw)
+    # 5) Extract SQL & explanation (any text outside the Markdown fence)
     if m:
         sql = m.group(1).strip()
-        explanation = "\n".join(raw.splitlines()[1:])
+        explanation = (raw[: m.start()] + raw[m.end() :]).strip()
     else:
         # fallback: first non-fence line as SQL
         lines = [ln for ln in raw.splitlines() if ln and not ln.startswith("```")]
@@ -159,10 +350,21 @@ def generate_sql_via_ai(
         return
 
     print("Executing SQL:\n", sql)
-    print("\n Explanation:\n", explanation)
+    # The explanation is empty when the stream was cut short after valid SQL
+    if explanation:
+        print("\n Explanation:\n", explanation)
 
-    # 5) Execute and display results
-    execute_sql(conn, sql)
+    # 6) Execute and display results; only remember SQL that ran cleanly,
+    #    keeping any explanation already cached rather than blanking it
+    if execute_sql(conn, sql):
+        with conn:
+            conn.execute(
+                f'INSERT INTO "{LLM_CACHE_TABLE}" (key, sql, explanation) '
+                "VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                "sql = excluded.sql, "
+                "explanation = COALESCE(NULLIF(excluded.explanation, ''), explanation)",
+                (key, sql, explanation),
+            )
 
 
 def main():
@@ -175,7 +377,8 @@ def main():
         return
 
     client = OpenAI(api_key=api_key)
-    conn = sqlite3.connect(str(args.db))
+    conn = connect(args.db)
+    init_llm_cache(conn)
 
     logging.info("Starting Chat-Sheet (DB: %s)", args.db)
     try:
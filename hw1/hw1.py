@@ -1,10 +1,24 @@
 import numpy as np
 from sklearn.neighbors import BallTree
 
+# Optional numexpr integration for evaluating the haversine formula in one pass.
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
+# Below this many reference points, a dense distance matrix beats building a BallTree
+BRUTE_FORCE_MAX_POINTS = 512
+# Maximum number of entries in one block of the dense distance matrix (~32 MB of float64)
+BRUTE_FORCE_BLOCK_SIZE = 4_000_000
+
 def haversine_distance(lat1, lon1, lat2, lon2):
     """
     Using haversine metric to calculate the distance between two points 
     on the Earth's surface.
+    If numexpr is available, the whole formula (including the degree to
+    radian conversion) is evaluated as one fused expression, avoiding a
+    full-size temporary array for every intermediate step.
     
     Parameters:
         lat1, lon1: Latitude and longitude of point 1 in degrees.
@@ -15,6 +29,17 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     """
     # Earth's radius in kilometers
     r= 6371.0
+
+    if ne is not None:
+        deg = np.pi / 180.0
+        result = ne.evaluate(
+            "2 * r * arcsin(sqrt(sin((lat2 - lat1) * deg / 2)**2"
+            " + cos(lat1 * deg) * cos(lat2 * deg) * sin((lon2 - lon1) * deg / 2)**2))",
+            local_dict={"lat1": lat1, "lon1": lon1, "lat2": lat2, "lon2": lon2,
+                        "r": r, "deg": deg},
+        )
+        # numexpr always returns an ndarray; unwrap 0-d results to match the numpy path
+        return result[()]
     
     # Convert degrees to radians
     lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
@@ -30,7 +55,11 @@ def haversine_distance(lat1, lon1, lat2, lon2):
 def find_closest_points(array1, array2):
     """
     Match each point in array1 to the closest point in array2.
-    Find the nearest neighbors using sklearn's BallTree algorithm:
+    For small reference sets (fewer than BRUTE_FORCE_MAX_POINTS points) the full
+    (N, M) haversine distance matrix is computed directly, which is cheaper than
+    building a tree; array1 is processed in row blocks so the matrix never exceeds
+    BRUTE_FORCE_BLOCK_SIZE entries. Otherwise the nearest neighbors are found using sklearn's
+    BallTree algorithm:
     https://ogrisel.github.io/scikit-learn.org/sklearn-tutorial/modules/generated/sklearn.neighbors.BallTree.html
     Parameters:
         array1: Array of points (latitude, longitude) - shape (N, 2)
@@ -40,6 +69,23 @@ def find_closest_points(array1, array2):
         A list of indices from array2 that are the closest points to each point in array1.
     """
     
+    array1 = np.asarray(array1)
+    array2 = np.asarray(array2)
+    
+    if len(array2) < BRUTE_FORCE_MAX_POINTS:
+        indices = np.empty(len(array1), dtype=np.intp)
+        distances_km = np.empty(len(array1))
+        rows = max(1, BRUTE_FORCE_BLOCK_SIZE // max(1, len(array2)))
+        for start in range(0, len(array1), rows):
+            block = array1[start:start + rows]
+            # Broadcast (rows, 1) against (1, M) to get every pairwise distance in the block
+            d = haversine_distance(block[:, 0, None], block[:, 1, None],
+                                   array2[None, :, 0], array2[None, :, 1])
+            idx = d.argmin(axis=1)
+            indices[start:start + rows] = idx
+            distances_km[start:start + rows] = d[np.arange(len(block)), idx]
+        return indices, distances_km
+    
     # Convert degrees to radians for BallTree
     array2_radians = np.radians(array2)
     
@@ -1,9 +1,10 @@
 import socket
 import threading
-import json
 import time
 import sys
 
+from protocol import send_message, send_heartbeat, recv_frame, decode_message
+
 # Server configuration (connect to the central server)
 SERVER_HOST = '127.0.0.1'
 SERVER_PORT = 5000
@@ -11,33 +12,48 @@ SERVER_PORT = 5000
 # Heartbeat interval (seconds)
 HEARTBEAT_INTERVAL = 5
 
-def send_heartbeat(sock, client_id):
-    """Send heartbeat messages periodically to the server."""
+# Connections that get periodic heartbeats from the single shared pump thread.
+_hb_registry = []  # [sock, ...]
+_hb_lock = threading.Lock()
+_hb_thread = None
+
+def register_heartbeat(sock):
+    """Add a connection to the heartbeat pump, starting the pump thread on first use."""
+    global _hb_thread
+    with _hb_lock:
+        _hb_registry.append(sock)
+        if _hb_thread is None:
+            _hb_thread = threading.Thread(target=_heartbeat_pump, daemon=True)
+            _hb_thread.start()
+
+def _heartbeat_pump():
+    """Send a heartbeat on every registered connection every HEARTBEAT_INTERVAL seconds."""
     while True:
-        heartbeat_msg = {
-            "action": "heartbeat",
-            "sender": client_id,
-            "timestamp": time.time()
-        }
-        try:
-            sock.send(json.dumps(heartbeat_msg).encode())
-        except Exception as e:
-            print("Heartbeat error:", e)
-            break
+        with _hb_lock:
+            socks = list(_hb_registry)
+        for sock in socks:
+            try:
+                send_heartbeat(sock, time.time())
+            except Exception as e:
+                print("Heartbeat error:", e)
+                with _hb_lock:
+                    _hb_registry.remove(sock)
         time.sleep(HEARTBEAT_INTERVAL)
 
 def receive_messages(sock):
     """Continuously receive messages from the server."""
+    # Buffered reader so many small frames are served from one recv syscall.
+    rfile = sock.makefile('rb', buffering=65536)
     while True:
         try:
-            data = sock.recv(1024).decode()
-            if not data:
+            frame = recv_frame(rfile)
+            if frame is None:
                 print("Server closed connection.")
                 break
             try:
-                message = json.loads(data)
-            except json.JSONDecodeError:
-                print("Received invalid message:", data)
+                message = decode_message(frame)
+            except ValueError:
+                print("Received invalid message:", frame)
                 continue
             # Print received message.
             if message.get("action") == "message":
@@ -63,7 +79,7 @@ def send_messages(sock, client_id):
                 "timestamp": time.time(),
                 "payload": payload
             }
-            sock.send(json.dumps(message).encode())
+            send_message(sock, message)
         except Exception as e:
             print("Error sending message:", e)
             break
@@ -95,11 +111,11 @@ def main():
         "sender": client_id,
         "timestamp": time.time()
     }
-    sock.send(json.dumps(register_msg).encode())
+    send_message(sock, register_msg)
     print(f"Registered with server as '{client_id}'.")
 
-    # Start heartbeat thread.
-    threading.Thread(target=send_heartbeat, args=(sock, client_id), daemon=True).start()
+    # Hand the connection to the shared heartbeat thread.
+    register_heartbeat(sock)
     # Start thread for receiving messages.
     threading.Thread(target=receive_messages, args=(sock,), daemon=True).start()
 
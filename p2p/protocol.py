@@ -0,0 +1,103 @@
+import asyncio
+import json
+import struct
+import threading
+import weakref
+
+# Optional orjson integration for faster message encoding/decoding.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Every message on the wire is a 4-byte big-endian length followed by the JSON body.
+HEADER_SIZE = 4
+# Largest frame body accepted from a peer; anything bigger is treated as a protocol error
+# so a bogus length prefix can't make the reader buffer gigabytes.
+MAX_FRAME_SIZE = 1024 * 1024
+
+# Heartbeats skip JSON: their body is a 1-byte tag plus a little-endian float64 timestamp.
+# The sender is already known from the connection's register message. JSON bodies
+# always start with '{', so the tag can't be mistaken for one.
+MSG_HEARTBEAT = 1
+HEARTBEAT_STRUCT = struct.Struct('<Bd')
+
+# One lock per socket, so frames sent from different threads are never interleaved.
+_send_locks = weakref.WeakKeyDictionary()
+_send_locks_guard = threading.Lock()
+
+def _send_lock(sock):
+    """Return the send lock for sock, creating it on first use."""
+    with _send_locks_guard:
+        lock = _send_locks.get(sock)
+        if lock is None:
+            lock = _send_locks[sock] = threading.Lock()
+        return lock
+
+def _send_frame(sock, body):
+    """Send one length-prefixed frame while holding the socket's send lock."""
+    frame = len(body).to_bytes(HEADER_SIZE, 'big') + body
+    with _send_lock(sock):
+        sock.sendall(frame)
+
+def encode_message(message):
+    """Serialize a message dict to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(message)
+    return json.dumps(message).encode()
+
+def decode_message(data):
+    """Parse JSON bytes into a message dict. Raises ValueError on bad input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def send_message(sock, message):
+    """Send one length-prefixed message, retrying until every byte is written."""
+    _send_frame(sock, encode_message(message))
+
+def send_heartbeat(sock, timestamp):
+    """Send one binary heartbeat frame."""
+    _send_frame(sock, HEARTBEAT_STRUCT.pack(MSG_HEARTBEAT, timestamp))
+
+def is_heartbeat(frame):
+    """Return True if a frame body is a binary heartbeat."""
+    return len(frame) == HEARTBEAT_STRUCT.size and frame[0] == MSG_HEARTBEAT
+
+def _frame_size(header):
+    """Decode a length prefix, raising ValueError if it exceeds MAX_FRAME_SIZE."""
+    size = int.from_bytes(header, 'big')
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {size} bytes exceeds MAX_FRAME_SIZE ({MAX_FRAME_SIZE})")
+    return size
+
+def recv_frame(rfile):
+    """
+    Read one frame body from a buffered socket file (sock.makefile('rb')),
+    or return None at end of stream. Raises ValueError for oversized frames.
+    """
+    header = rfile.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        return None
+    size = _frame_size(header)
+    body = rfile.read(size)
+    if len(body) < size:
+        return None
+    return body
+
+async def write_message(writer, message):
+    """Send one length-prefixed message on an asyncio StreamWriter."""
+    body = encode_message(message)
+    writer.write(len(body).to_bytes(HEADER_SIZE, 'big') + body)
+    await writer.drain()
+
+async def read_frame(reader):
+    """
+    Read one frame body from an asyncio StreamReader, or None at end of stream.
+    Raises ValueError for oversized frames.
+    """
+    try:
+        header = await reader.readexactly(HEADER_SIZE)
+        return await reader.readexactly(_frame_size(header))
+    except asyncio.IncompleteReadError:
+        return None
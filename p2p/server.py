@@ -1,8 +1,10 @@
-import socket
-import threading
-import json
+import asyncio
+import heapq
+import itertools
 import time
 
+from protocol import read_frame, write_message, is_heartbeat, encode_message, decode_message
+
 # Optional Redis integration for persistent offline storage.
 USE_REDIS = False
 try:
@@ -18,59 +20,85 @@ SERVER_HOST = '127.0.0.1'
 SERVER_PORT = 5000
 
 # Data structures:
-# clients: mapping from client_id to a dictionary with socket and last_seen timestamp.
-clients = {}  # {client_id: {"socket": socket, "last_seen": timestamp}}
+# clients: mapping from client_id to a dictionary with stream writer, last_seen timestamp
+# and the generation of its most recent expiry_heap entry.
+# Only touched from the event loop, so no locking is needed.
+clients = {}  # {client_id: {"writer": StreamWriter, "last_seen": timestamp, "gen": int}}
+# expiry_heap: min-heap of (deadline, client_id, gen). Entries whose gen no longer matches
+# clients[client_id]["gen"] were superseded by a later heartbeat and are skipped when popped.
+expiry_heap = []
+generations = itertools.count()
 # For in-memory offline storage (used if Redis is not available)
 offline_messages = {}  # {client_id: [message1, message2, ...]}
 
 HEARTBEAT_TIMEOUT = 15  # seconds
+HEARTBEAT_CHECK_INTERVAL = 1  # seconds
 
 def store_offline_message(recipient, message):
+    store_offline_messages_bulk(recipient, [message])
+
+def store_offline_messages_bulk(recipient, messages):
+    """Queue several messages for an offline recipient in one storage round trip."""
+    if not messages:
+        return
     if USE_REDIS:
-        # Store the message as a JSON string in a Redis list keyed by "offline:<recipient>"
-        redis_client.rpush(f"offline:{recipient}", json.dumps(message))
+        # Store the messages as JSON strings in a Redis list keyed by "offline:<recipient>"
+        redis_client.rpush(f"offline:{recipient}", *map(encode_message, messages))
     else:
-        offline_messages.setdefault(recipient, []).append(message)
-    print(f"Stored offline message for {recipient}.")
+        offline_messages.setdefault(recipient, []).extend(messages)
+    print(f"Stored {len(messages)} offline message(s) for {recipient}.")
 
 def retrieve_offline_messages(client_id):
-    messages = []
     if USE_REDIS:
+        # Read and clear the whole list atomically in a single round trip.
         key = f"offline:{client_id}"
-        while True:
-            msg = redis_client.lpop(key)
-            if msg is None:
-                break
-            messages.append(json.loads(msg))
-    else:
-        messages = offline_messages.pop(client_id, [])
-    return messages
-
-def handle_client(client_socket, address):
+        pipe = redis_client.pipeline()
+        pipe.lrange(key, 0, -1)
+        pipe.delete(key)
+        raw, _ = pipe.execute()
+        return [decode_message(msg) for msg in raw]
+    return offline_messages.pop(client_id, [])
+
+def refresh_deadline(client_id):
+    """Mark client_id as seen now and schedule its expiry HEARTBEAT_TIMEOUT from now."""
+    info = clients[client_id]
+    info["last_seen"] = time.time()
+    info["gen"] = next(generations)
+    heapq.heappush(expiry_heap, (info["last_seen"] + HEARTBEAT_TIMEOUT, client_id, info["gen"]))
+
+async def handle_client(reader, writer):
+    address = writer.get_extra_info('peername')
+    print(f"Accepted connection from {address}")
     client_id = None
     try:
         while True:
-            data = client_socket.recv(1024).decode()
-            if not data:
+            frame = await read_frame(reader)
+            if frame is None:
                 break  # client disconnected
+            if is_heartbeat(frame):
+                # Update last seen timestamp; no JSON to parse.
+                if client_id in clients:
+                    refresh_deadline(client_id)
+                continue
             try:
-                message = json.loads(data)
-            except json.JSONDecodeError:
-                print("Received invalid JSON:", data)
+                message = decode_message(frame)
+            except ValueError:
+                print("Received invalid JSON:", frame)
                 continue
 
             action = message.get("action")
 
             if action == "register":
                 client_id = message.get("sender")
-                clients[client_id] = {"socket": client_socket, "last_seen": time.time()}
+                clients[client_id] = {"writer": writer}
+                refresh_deadline(client_id)
                 print(f"[{time.ctime()}] Registered client '{client_id}' from {address}")
                 # Check and deliver any offline messages.
                 msgs = retrieve_offline_messages(client_id)
                 if msgs:
                     for offline_msg in msgs:
                         try:
-                            client_socket.send(json.dumps(offline_msg).encode())
+                            await write_message(writer, offline_msg)
                         except Exception as e:
                             print(f"Error sending offline message to {client_id}: {e}")
                 continue
@@ -78,7 +106,7 @@ def handle_client(client_socket, address):
             elif action == "heartbeat":
                 # Update last seen timestamp.
                 if client_id in clients:
-                    clients[client_id]["last_seen"] = time.time()
+                    refresh_deadline(client_id)
                 continue
 
             elif action == "message":
@@ -90,7 +118,7 @@ def handle_client(client_socket, address):
                 # Check if recipient is online and active.
                 if recipient in clients and (time.time() - clients[recipient]["last_seen"] <= HEARTBEAT_TIMEOUT):
                     try:
-                        clients[recipient]["socket"].send(json.dumps(message).encode())
+                        await write_message(clients[recipient]["writer"], message)
                     except Exception as e:
                         print(f"Error sending message to {recipient}: {e}")
                         store_offline_message(recipient, message)
@@ -105,42 +133,34 @@ def handle_client(client_socket, address):
         print(f"Exception with client '{client_id}':", e)
     finally:
         if client_id:
-            if client_id in clients:
+            # Don't drop a newer connection that re-registered the same ID.
+            if client_id in clients and clients[client_id]["writer"] is writer:
                 del clients[client_id]
             print(f"Connection with client '{client_id}' closed.")
-        client_socket.close()
+        writer.close()
 
 def heartbeat_checker():
-    """Background thread to check for stale client connections."""
-    while True:
-        current_time = time.time()
-        to_remove = []
-        for client_id, info in list(clients.items()):
-            if current_time - info["last_seen"] > HEARTBEAT_TIMEOUT:
-                print(f"Client '{client_id}' timed out (last seen {int(current_time - info['last_seen'])} seconds ago).")
-                to_remove.append(client_id)
-        for client_id in to_remove:
-            try:
-                clients[client_id]["socket"].close()
-            except Exception:
-                pass
-            del clients[client_id]
-        time.sleep(5)
-
-def start_server():
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server_socket.bind((SERVER_HOST, SERVER_PORT))
-    server_socket.listen(5)
+    """Close client connections whose deadline passed, then reschedule itself on the event loop."""
+    current_time = time.time()
+    while expiry_heap and expiry_heap[0][0] <= current_time:
+        _, client_id, gen = heapq.heappop(expiry_heap)
+        info = clients.get(client_id)
+        if info is None or info["gen"] != gen:
+            continue  # client left or sent a newer heartbeat
+        print(f"Client '{client_id}' timed out (last seen {int(current_time - info['last_seen'])} seconds ago).")
+        info["writer"].close()
+        del clients[client_id]
+    asyncio.get_running_loop().call_later(HEARTBEAT_CHECK_INTERVAL, heartbeat_checker)
+
+async def start_server():
+    server = await asyncio.start_server(handle_client, SERVER_HOST, SERVER_PORT)
     print(f"Server listening on {SERVER_HOST}:{SERVER_PORT}")
 
-    # Start heartbeat checking thread.
-    threading.Thread(target=heartbeat_checker, daemon=True).start()
+    # Schedule periodic heartbeat checks on the event loop.
+    asyncio.get_running_loop().call_later(HEARTBEAT_CHECK_INTERVAL, heartbeat_checker)
 
-    while True:
-        client_socket, address = server_socket.accept()
-        print(f"Accepted connection from {address}")
-        threading.Thread(target=handle_client, args=(client_socket, address), daemon=True).start()
+    async with server:
+        await server.serve_forever()
 
 if __name__ == '__main__':
-    start_server()
+    asyncio.run(start_server())